@@ -1,10 +1,32 @@
 import os
+import re
 import csv
+import json
+import codecs
 import time
 import datetime
+import email.utils
+import functools
+import itertools
+import threading
+import contextlib
 import collections
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
 
 
@@ -20,24 +42,290 @@ class RequestEngineError(ApiWrappyError):
     pass
 
 
+class RateLimitError(RequestEngineError):
+    pass
+
+
 class KeysParserError(ApiWrappyError):
     pass
 
 
+CSV_HEADERS = (
+    'QUERY', 'TOTAL_API', 'TOTAL_EXTRACTED', 'SOURCE_LINK', 'API_SOURCE', 'ID', 'NAME', 'IS_CLOSED', 'CATEGORY_1', 'CATEGORY_2',
+    'CATEGORY_3', 'RATING', 'REVIEWS_AMOUNT', 'LIKES_AMOUNT', 'CHECKINS', 'PRICE', 'LATITUDE',
+    'LONGITUDE', 'ADDRESS', 'PHONE', 'WEBSITE', 'CREATED_AT_DATE', 'RUN_TIMESTAMP'
+)
+
+
+_EMPTY = {}  # shared default for missing nested json objects, never modified
+
+_CELL_DROP_CHARS = str.maketrans('', '', ';\r\n')
+
+
+def _cell(value):
+    """ Output csv cell: delimiter and line breaks removed, quotes escaped csv style, empty values as '-'.
+    """
+    if not value:
+        return '-'
+
+    value = str(value).translate(_CELL_DROP_CHARS)
+    if not value.strip():
+        return '-'
+
+    if '"' in value:
+        value = '"{}"'.format(value.replace('"', '""'))
+
+    return value
+
+
+@functools.lru_cache(maxsize=1)
+def _format_run_timestamp(epoch_seconds):
+    return datetime.datetime.fromtimestamp(epoch_seconds, datetime.timezone.utc).strftime('%d.%m.%Y/%H:%M:%S')
+
+
+def _run_timestamp():
+    """ UTC timestamp for the RUN_TIMESTAMP column, formatted once per second.
+    """
+    return _format_run_timestamp(int(time.time()))
+
+
+class TokenBucket:
+    """ Thread safe token bucket: rate - tokens added per second (None - not throttled), capacity - burst size.
+    acquire() blocks until a token is available, raises RateLimitError once the API quota is exhausted.
+    The rate adapts to the quota reported by API, but never drops below min_rate_ratio * rate.
+    """
+    def __init__(self, rate, capacity, *, min_rate_ratio=0.1, max_wait=60):
+        self.max_rate = rate
+        self.min_rate = rate * min_rate_ratio if rate else None
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._resume_at = 0
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if self._exhausted:
+                    raise RateLimitError('API quota exhausted')
+
+                wait = self._resume_at - time.monotonic()
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def _exhaust(self, reset_time):
+        """ Pauses the bucket till reset_time (seconds from now) if it is within max_wait,
+        otherwise the next acquire() raises RateLimitError instead of blocking for hours.
+        """
+        if reset_time is not None and reset_time <= self.max_wait:
+            self._resume_at = time.monotonic() + max(reset_time, 0)
+        else:
+            self._exhausted = True
+
+    def update(self, remaining, reset_time=None):
+        """ Count based quota (Yelp, Foursquare): while plenty of requests remain
+        the bucket runs at max_rate, once remaining drops to the bucket capacity
+        the rest is spread till reset_time (seconds from now), not slower than min_rate.
+        """
+        with self._lock:
+            if remaining <= 0:
+                self._exhaust(reset_time)
+                return
+
+            if self.max_rate is None:
+                return
+
+            self._refill()
+            if remaining > self.capacity:
+                self.rate = self.max_rate
+                return
+
+            reset_time = reset_time if reset_time and reset_time > 0 else 60
+            self.rate = max(self.min_rate, min(self.max_rate, remaining / reset_time))
+            self._tokens = min(self._tokens, remaining)
+
+    def update_usage(self, usage, threshold=75):
+        """ Percent based quota (Facebook x-app-usage): max_rate up to threshold percents used,
+        above it the rate is lowered proportionally down to min_rate, 100% means exhausted.
+        """
+        with self._lock:
+            if usage >= 100:
+                self._exhaust(None)
+                return
+
+            if self.max_rate is None:
+                return
+
+            self._refill()
+            if usage <= threshold:
+                self.rate = self.max_rate
+                return
+
+            self.rate = max(self.min_rate, self.max_rate * (100 - usage) / (100 - threshold))
+
+
 class RequestEngine:
-    def GET(self, url, **kwargs):
-        """ Wrapper for requests.get method
-        --> requests.Response, dict
+    """ Responses of CACHED_ENDPOINTS are kept on disk for cache_expire_after seconds
+    when requests-cache is installed, credentials are excluded from the cache keys.
+    """
+    ENDPOINTS = {}
+    CACHED_ENDPOINTS = []
+    CACHE_NAME = 'apiwrappy_cache'
+    CACHE_IGNORED_PARAMETERS = ['client_id', 'client_secret', 'access_token', 'v']
+
+    def __init__(self, *, rate=10, capacity=10, pool_connections=4, pool_maxsize=32, cache_expire_after=86400):
+        """ One persistent session per wrapper, connections to the API hosts
+        are kept alive and reused between requests.
+        Requests are throttled by a token bucket: rate - requests per second (None - no throttling),
+        capacity - burst size.
+        """
+        if requests_cache is not None and self.CACHED_ENDPOINTS and cache_expire_after:
+            self._session = requests_cache.CachedSession(
+                self.CACHE_NAME, backend='sqlite', expire_after=requests_cache.DO_NOT_CACHE,
+                urls_expire_after=self._cache_urls_expire_after(cache_expire_after),
+                ignored_parameters=self.CACHE_IGNORED_PARAMETERS
+            )
+        else:
+            self._session = requests.Session()
+
+        self._session.mount('https://', HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+        self._bucket = TokenBucket(rate, capacity)
+
+    def _cache_urls_expire_after(self, expire_after):
+        """ requests-cache url patterns, the first matching pattern wins,
+        so not cached endpoints go first: venues/search before venues/*.
+        """
+        urls_expire_after = {}
+        for name in sorted(self.ENDPOINTS, key=lambda name: name in self.CACHED_ENDPOINTS):
+            url_pattern = self.ENDPOINTS[name].split('://', 1)[-1].replace('{}', '*')
+            if name in self.CACHED_ENDPOINTS:
+                urls_expire_after[url_pattern] = expire_after
+            else:
+                urls_expire_after[url_pattern] = requests_cache.DO_NOT_CACHE
+
+        return urls_expire_after
+
+    def _parse_rate_limit_headers(self, headers):
+        """ Remaining requests and seconds till reset from response headers:
+            Yelp - RateLimit-Remaining, RateLimit-ResetTime (ISO 8601)
+            Foursquare - X-RateLimit-Remaining, X-RateLimit-Reset (epoch)
+        --> int, float | None, None
+        """
+        if 'RateLimit-Remaining' in headers:
+            reset_time = None
+            if headers.get('RateLimit-ResetTime'):
+                reset_at = datetime.datetime.fromisoformat(headers['RateLimit-ResetTime'])
+                reset_time = (reset_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            return int(headers['RateLimit-Remaining']), reset_time
+
+        if 'X-RateLimit-Remaining' in headers:
+            reset_time = None
+            if headers.get('X-RateLimit-Reset'):
+                reset_time = int(headers['X-RateLimit-Reset']) - time.time()
+            return int(headers['X-RateLimit-Remaining']), reset_time
+
+        return None, None
+
+    def _parse_app_usage_header(self, headers):
+        """ Facebook x-app-usage: percents of the hourly quota used, the highest one counts.
+        --> int | None
+        """
+        if 'x-app-usage' in headers:
+            return max(json.loads(headers['x-app-usage']).values(), default=0)
+
+        return None
+
+    def _update_rate_limit(self, headers):
+        try:
+            usage = self._parse_app_usage_header(headers)
+            remaining, reset_time = self._parse_rate_limit_headers(headers)
+        except (ValueError, TypeError, AttributeError) as e:
+            if _VERBOSE:
+                print('Error({}). {}: rate limit headers: {}'.format(
+                    e.__class__.__name__, self.__class__.__name__, e
+                ))
+            return
+
+        if usage is not None:
+            self._bucket.update_usage(usage)
+
+        if remaining is not None:
+            self._bucket.update(remaining, reset_time)
+
+    def _retry_after(self, response, attempt):
+        """ Seconds to wait before retrying a 429 response: Retry-After header (seconds or HTTP date),
+        exponential backoff 1, 2, 4... seconds if it is missing.
+        """
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                pass
+
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                pass
+            else:
+                if retry_at.tzinfo is None:
+                    retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+                return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+
+        return 2 ** attempt
+
+    def GET(self, url, parse_json=True, **kwargs):
+        """ Wrapper for requests.Session.get method
+        Error responses are never decoded: 429 and 5xx are retried up to errors_limit,
+        after 429 the wrapper's requests are paused for Retry-After seconds,
+        other 4xx raise RequestEngineError right away.
+        --> requests.Response, dict | None
         """
         errors = 0
-        default_delay_per_request = 0.1
         while True:
             try:
-                time.sleep(default_delay_per_request)
-                response = requests.get(url, **kwargs)
-                response_json = response.json()
+                self._bucket.acquire()
+                response = self._session.get(url, **kwargs)
+                if not getattr(response, 'from_cache', False):
+                    self._update_rate_limit(response.headers)
+
+                if response.status_code == 429:
+                    retry_after = self._retry_after(response, errors)
+                    self._bucket.update(0, retry_after)
+                    raise RequestEngineError('HTTP 429, retry after {:.0f}s'.format(retry_after))
+
+                if response.status_code >= 500:
+                    raise RequestEngineError('HTTP {}'.format(response.status_code))
+
+                if not response.ok:
+                    break
+
+                response_json = _json_loads(response.content) if parse_json else None
                 return response, response_json
-            
+
+            except RateLimitError as e:
+                raise RateLimitError('Error({}). {}: {}'.format(
+                    e.__class__.__name__, self.__class__.__name__, e
+                ))
+
             except Exception as e:
                 errors += 1
                 error_msg = 'Error({}). {}: {}'.format(
@@ -48,14 +336,46 @@ class RequestEngine:
                 
                 if _VERBOSE:
                     print(error_msg)
-                
+
+        raise RequestEngineError('Error(HTTP {}). {}: {}'.format(
+            response.status_code, self.__class__.__name__, response.text
+        ))
+
+
+class RowWriter:
+    """ Writes ROW dicts to the binary output file in CSV_HEADERS order as ';' joined lines,
+    cells are sanitized by _cell so the csv module is not needed.
+    """
+    def __init__(self, OUT, headers=CSV_HEADERS, encoding='utf-8-sig'):
+        self._write = OUT.write
+        self._encode = codecs.getincrementalencoder(encoding)().encode
+        self._headers = tuple(headers)
+
+    def _writeline(self, cells):
+        self._write(self._encode(';'.join(cells) + '\n'))
+
+    def writeheader(self):
+        self._writeline(self._headers)
+
+    def writerow(self, row):
+        self._writeline([_cell(row.get(h)) for h in self._headers])
+
+    def writerows(self, rows, batch_size=1000):
+        """ Rows are joined and encoded batch_size lines at a time, rows may be a generator.
+        """
+        headers = self._headers
+        lines = (';'.join([_cell(row.get(h)) for h in headers]) + '\n' for row in rows)
+        while True:
+            batch = ''.join(itertools.islice(lines, batch_size))
+            if not batch:
+                break
+
+            self._write(self._encode(batch))
+
 
 class FileTools:
-    CSV_HEADERS = [
-        'QUERY', 'TOTAL_API', 'TOTAL_EXTRACTED', 'SOURCE_LINK', 'API_SOURCE', 'ID', 'NAME', 'IS_CLOSED', 'CATEGORY_1', 'CATEGORY_2',
-        'CATEGORY_3', 'RATING', 'REVIEWS_AMOUNT', 'LIKES_AMOUNT', 'CHECKINS', 'PRICE', 'LATITUDE',
-        'LONGITUDE', 'ADDRESS', 'PHONE', 'WEBSITE', 'CREATED_AT_DATE', 'RUN_TIMESTAMP'
-    ]
+    CSV_BUFFER_SIZE = 1 << 20
+    CSV_HEADERS = CSV_HEADERS
 
     def create_default_input(self, filename, encoding='utf-8-sig'):
         """ Creates default input csv file, must end with '_input.csv':
@@ -69,20 +389,45 @@ class FileTools:
             OUT = csv.writer(OUT, delimiter=';', lineterminator='\n', escapechar='\\')
             OUT.writerow(headers)
     
+    @contextlib.contextmanager
+    def open_stream(self, filename=None, encoding='utf-8-sig'):
+        """ Opens output csv with the header row written, rows go to disk
+        through a 1 MiB buffer as soon as they are parsed.
+        --> RowWriter
+        """
+        if filename is None:
+            filename = 'output_{}.csv'.format(datetime.datetime.utcnow().strftime('%d%m%Y_%H%M%S'))
+
+        with open(filename, 'wb', buffering=self.CSV_BUFFER_SIZE) as OUT:
+            writer = RowWriter(OUT, self.CSV_HEADERS, encoding)
+            writer.writeheader()
+            yield writer
+
     def csv_out(self, DATA, encoding='utf-8-sig'):
-        filename = 'output_{}.csv'.format(datetime.datetime.utcnow().strftime('%d%m%Y_%H%M%S'))
-        with open(filename, 'w', encoding=encoding) as OUT:
-            OUT = csv.writer(OUT, delimiter=';', lineterminator='\n', escapechar='\\')
-            OUT.writerow(self.CSV_HEADERS)
-            
-            for row in DATA['rows']:
-                OUT.writerow([row.get(h) if row.get(h, '') and str(row.get(h, '')).strip() else '-' for h in self.CSV_HEADERS])
+        with self.open_stream(encoding=encoding) as OUT:
+            OUT.writerows(DATA['rows'])
 
                     
+def _read_keys(filename, placeholder):
+    """ "# foursquare_client_id = KEY" lines --> {'foursquare': {'client_id': 'KEY'}}
+    """
+    keys_pattern = re.compile(r'^\s*#\s*([a-z]+)_(\w+)\s*=\s*(\S+)', re.IGNORECASE)
+    keys = collections.defaultdict(dict)
+    with open(filename, encoding='utf-8') as IN_TXT:
+        for line in IN_TXT:
+            match = keys_pattern.match(line)
+            if match and match.group(3) != placeholder:
+                keys[match.group(1).lower()][match.group(2).lower()] = match.group(3)
+
+    return dict(keys)
+
+
 class KeysParser:
-    """ Key's line must start with a hash sign, "#"
-    Headers must contain API provider name with a slash: "yelp_", "foursquare_" etc
-    Keys must be separated from headers with the equal sign and whitespaces, " = "
+    """ Key's line must start with a hash sign, "#" (whitespace around it is allowed)
+    Headers must start with API provider name and an underscore: "yelp_apikey", "foursquare_client_id" etc,
+    the part before the first underscore is the provider, the rest is the key name
+    Keys must be separated from headers with the equal sign, whitespaces around it are optional
+    Keys left as "set_key_here" are skipped
     """
     KEY_PLACEHOLDER = 'set_key_here'
     PARSE_FROM = 'requirements.txt' if not os.path.exists('requirements_dev.txt') else 'requirements_dev.txt'
@@ -90,46 +435,47 @@ class KeysParser:
     if _VERBOSE:
         print('KEYS PARSED:', PARSE_FROM)
 
-    with open(PARSE_FROM, encoding='utf-8') as IN_TXT:
-        KEYS_LINES = [
-            l.replace('#', '').strip() for l in IN_TXT.readlines() if l.startswith('#') and ' = ' in l.strip()
-        ]
+    KEYS = _read_keys(PARSE_FROM, KEY_PLACEHOLDER)
 
-    def parse_keys(self, wrapper_alias):
-        keys = {}
-        for keys_line in self.KEYS_LINES:
-            header, key = keys_line.split(' = ')
-            header = header.lower()
-            if wrapper_alias in header and key != self.KEY_PLACEHOLDER and key:
-                keys[header.replace(wrapper_alias, '').strip('_')] = key
+    @classmethod
+    def parse_keys(cls, wrapper_alias):
+        return dict(cls.KEYS.get(wrapper_alias, {}))
 
-        return keys
+
+def _list_input_files():
+    with os.scandir() as entries:
+        return [e.name for e in entries if e.name.endswith('_input.csv') and e.is_file()]
 
 
 class InputTermsParser:
     """ {title}_input.csv filename pattern for all input files assumed.
     """
-    INPUT_FILES = [f for f in os.listdir() if f.endswith('_input.csv')]
+    INPUT_FILES = _list_input_files()
 
     if _VERBOSE:
         print('INPUT FILES:', INPUT_FILES)
 
-    def filter_empty_values(self, dict_to_filter):
-        return {k: v for k, v in dict_to_filter.items() if v.strip()}
-
-    def parse_terms(self, terms_headers):
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _read_terms(cls, terms_headers):
+        """ Input files are read once per terms_headers tuple.
+        --> tuple of ((header, value), ...) per input row
+        """
+        headers = [None if h.startswith('drop_') else h for h in terms_headers]
         terms = []
-        for filename in self.INPUT_FILES:
+        for filename in cls.INPUT_FILES:
             with open(filename, encoding='utf-8') as IN_CSV:
                 csv_data = csv.reader(IN_CSV, delimiter=';'); next(csv_data)
                 for row in csv_data:
                     if not row: continue
-                    term = self.filter_empty_values(
-                        {k: v for k, v in zip(terms_headers, row) if not k.startswith('drop_')}
-                    )
-                    terms.append(term)
+                    terms.append(tuple((k, v) for k, v in zip(headers, row) if k and v.strip()))
+
+        return tuple(terms)
 
-        return terms
+    def parse_terms(self, terms_headers):
+        """ Returns new term dicts on every call, wrappers modify terms in place.
+        """
+        return [dict(term) for term in self._read_terms(tuple(terms_headers))]
 
 
 class ApiStats:
@@ -150,7 +496,7 @@ class Yelp__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, A
     }
     STATS_HEADERS = ['RateLimit-DailyLimit', 'RateLimit-Remaining', 'RateLimit-ResetTime']
 
-    def __init__(self, *, timeout=3, errors_limit=3, delay_per_request=0.1):
+    def __init__(self, *, timeout=3, errors_limit=3, delay_per_request=0.1, max_workers=8):
         """ Currently Yelp fusion API limits maximim results returned (1000).
         API sets limit per offset maximum results returned (50).
         
@@ -160,26 +506,27 @@ class Yelp__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, A
         Source info link:
             https://www.yelp.com/developers/faq
         """
+        super().__init__(rate=1 / delay_per_request if delay_per_request else None)
         self.yelp_api_results_max_limit = 1000
         self.limit_max_per_offset = 50
         self._errors_limit = errors_limit
         self._timeout = timeout
-        self._delay_per_request = delay_per_request
+        self._max_workers = max_workers
 
         self.keys = self.parse_keys(self.API_ALIAS)
-        self._terms = self.parse_terms(self.TERMS_HEADERS)
+        self._terms = self.parse_terms(tuple(self.TERMS_HEADERS))
         self._headers = {'Authorization': 'Bearer {}'.format(self.keys.get('apikey', ''))}
+        self._request_kwargs = {'headers': self._headers, 'timeout': self._timeout}
 
     def business_search_endpoint(self, query):
         """ This endpoint returns up to 1000 businesses based on the provided search criteria.
         It has some basic information about the business.
+        query - dict or already urlencoded query string.
+        --> requests.Response, dict
         """
-        self._response, self._response_json = self.GET(
-            self.ENDPOINTS['BUSINESS_SEARCH'], headers=self._headers,
-            timeout=self._timeout, params=query
-        )
+        return self.GET(self.ENDPOINTS['BUSINESS_SEARCH'], params=query, **self._request_kwargs)
 
-    def parse_business_search_json_response(self, businesses, DATA, search_term_str):
+    def parse_business_search_json_response(self, businesses, writer, search_term_str):
         
         if _VERBOSE:
             print('  amount of businesses extracted: {:>5} (Total API ~ {:>5})'.format(
@@ -187,6 +534,8 @@ class Yelp__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, A
                 ), end='\n'*2
             )
 
+        run_timestamp = _run_timestamp()
+        rows = []
         for business in businesses:
             ROW = {}
             ROW['API_SOURCE'] = self.API_ALIAS
@@ -211,15 +560,18 @@ class Yelp__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, A
             ROW['REVIEWS_AMOUNT'] = business.get('review_count', '-')
             ROW['RATING'] = business.get('rating', '-')
             ROW['PRICE'] = len(business.get('price')) if '$' in business.get('price', '-') else '-'
-            ROW['LATITUDE'] = business.get('coordinates', {}).get('latitude', '-')
-            ROW['LONGITUDE'] = business.get('coordinates', {}).get('longitude', '-')
-            ROW['ADDRESS'] = ', '.join(business.get('location', {}).get('display_address', '-'))
+            coordinates = business.get('coordinates') or _EMPTY
+            ROW['LATITUDE'] = coordinates.get('latitude', '-')
+            ROW['LONGITUDE'] = coordinates.get('longitude', '-')
+            ROW['ADDRESS'] = ', '.join((business.get('location') or _EMPTY).get('display_address', '-'))
             ROW['PHONE'] = business.get('phone', '-').replace('+', '')
-            ROW['RUN_TIMESTAMP'] = datetime.datetime.utcnow().strftime('%d.%m.%Y/%H:%M:%S')
+            ROW['RUN_TIMESTAMP'] = run_timestamp
+
+            rows.append(ROW)
 
-            DATA['rows'].append(ROW)
+        writer.writerows(rows)
 
-    def run(self, DATA):
+    def run(self, writer):
         for term in self._terms:
             if not any(True for i in ['location', 'latitude', 'longitude'] if term.get(i)):
                 continue
@@ -231,30 +583,37 @@ class Yelp__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, A
             
             businesses = []
             term_limit_user = int(term.get('limit')) if term.get('limit') else None
-            offset = 0
             if term_limit_user and term_limit_user > self.limit_max_per_offset:
                 term['limit'] = self.limit_max_per_offset
-                
-                while offset < term_limit_user and offset < self.yelp_api_results_max_limit:
-                    term['offset'] = offset
-                    self.business_search_endpoint(term)
-                    time.sleep(self._delay_per_request)
-                    businesses_from_json_response = self._response_json.get('businesses', [])
+                term['offset'] = 0
 
-                    if _VERBOSE and offset % 100 == 0:
-                        print('  offset {}'.format(offset))
+                if _VERBOSE:
+                    print('  offset 0')
 
-                    offset += 50
-                    
-                    if businesses_from_json_response:
-                        businesses.extend(businesses_from_json_response)
-                    else:
-                        break
+                # first page gives the total, the rest of the offsets are fetched concurrently
+                self._response, self._response_json = self.business_search_endpoint(term)
+                businesses.extend(self._response_json.get('businesses', []))
+
+                results_limit = min(
+                    term_limit_user, self._response_json.get('total', 0), self.yelp_api_results_max_limit
+                )
+                offsets = range(self.limit_max_per_offset, results_limit, self.limit_max_per_offset)
+                # query string is encoded once, only the offset differs between pages
+                base_query = urllib.parse.urlencode({k: v for k, v in term.items() if k != 'offset'})
+                queries = ['{}&offset={}'.format(base_query, o) for o in offsets]
+                with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                    pages = executor.map(self.business_search_endpoint, queries)
+                    for offset, (response, response_json) in zip(offsets, pages):
+                        if _VERBOSE and offset % 100 == 0:
+                            print('  offset {}'.format(offset))
+
+                        self._response = response
+                        businesses.extend(response_json.get('businesses', []))
             else:
-                self.business_search_endpoint(term)
+                self._response, self._response_json = self.business_search_endpoint(term)
                 businesses.extend(self._response_json['businesses'])
 
-            self.parse_business_search_json_response(businesses, DATA, search_term_str)
+            self.parse_business_search_json_response(businesses, writer, search_term_str)
 
 
 class Foursquare__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, ApiStats):
@@ -266,16 +625,24 @@ class Foursquare__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTo
         'VENUE_SEARCH': 'https://api.foursquare.com/v2/venues/search',
         'VENUE_DETAILS': 'https://api.foursquare.com/v2/venues/{}'
     }
+    CACHED_ENDPOINTS = ['VENUE_DETAILS']
     STATS_HEADERS = ['X-RateLimit-Limit', 'X-RateLimit-Remaining', 'Date']
 
-    def __init__(self, *, errors_limit=3, delay_per_request=0.1):
+    def __init__(self, *, errors_limit=3, delay_per_request=0.1, max_workers=8, cache_expire_after=86400):
+        """ cache_expire_after - seconds details responses are cached for (with requests-cache installed),
+        0 or None disables the cache.
+        """
+        super().__init__(
+            rate=1 / delay_per_request if delay_per_request else None, cache_expire_after=cache_expire_after
+        )
         self._errors_limit = errors_limit
-        self._delay_per_request = delay_per_request
+        self._max_workers = max_workers
+        self._request_kwargs = {}
         
         self.keys = self.parse_keys(self.API_ALIAS)
         self._client_id = self.keys.get('client_id', '')
         self._client_secret = self.keys.get('client_secret', '')
-        self._terms = self.parse_terms(self.TERMS_HEADERS)
+        self._terms = self.parse_terms(tuple(self.TERMS_HEADERS))
         self._term_current_date = datetime.date.today().strftime('%Y%m%d')
 
     def _update_term_credentials(self, term):
@@ -287,22 +654,24 @@ class Foursquare__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTo
         """ Gives the full details about a venue including location, tips, and categories.
         If the venue ID given is one that has been merged into another “master” venue, the
         response will show data about the “master” instead of giving you an error.
+        --> requests.Response, dict
         """
-        self._response, self._response_json = self.GET(
-            self.ENDPOINTS['VENUE_DETAILS'].format(term.pop('foursquare_id')), params=term
+        return self.GET(
+            self.ENDPOINTS['VENUE_DETAILS'].format(term.pop('foursquare_id')), params=term, **self._request_kwargs
         )
 
     def venue_search_endpoint(self, term):
         """ Returns a list of venues near the current location, optionally matching a search term.
+        --> requests.Response, dict
         """
-        self._response, self._response_json = self.GET(self.ENDPOINTS['VENUE_SEARCH'], params=term)
+        return self.GET(self.ENDPOINTS['VENUE_SEARCH'], params=term, **self._request_kwargs)
 
     def parse_venues_search_json_response(self):
-        venues = self._response_json.get('response', {}).get('venues', {})
+        venues = (self._response_json.get('response') or _EMPTY).get('venues', [])
         return [{'foursquare_id': venue['id']} for venue in venues if venue.get('id')]
     
-    def parse_venue_details_json_response(self, DATA, search_term_str):
-        venue = self._response_json['response']['venue']
+    def parse_venue_details_json_response(self, response_json, writer, search_term_str):
+        venue = response_json['response']['venue']
 
         ROW = {}
         ROW['QUERY'] = search_term_str
@@ -310,11 +679,12 @@ class Foursquare__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTo
         ROW['API_SOURCE'] = self.API_ALIAS
         ROW['ID'] = venue.get('id', '-')
         ROW['NAME'] = venue.get('name', '-')
-        ROW['PHONE'] = venue.get('contact', {}).get('phone', '-')
+        ROW['PHONE'] = (venue.get('contact') or _EMPTY).get('phone', '-')
 
-        ROW['ADDRESS'] = ', '.join(venue.get('location', {}).get('formattedAddress', '-'))
-        ROW['LATITUDE'] = venue.get('location', {}).get('lat', '-')
-        ROW['LONGITUDE'] = venue.get('location', {}).get('lng', '-')
+        location = venue.get('location') or _EMPTY
+        ROW['ADDRESS'] = ', '.join(location.get('formattedAddress', '-'))
+        ROW['LATITUDE'] = location.get('lat', '-')
+        ROW['LONGITUDE'] = location.get('lng', '-')
 
         categories = venue.get('categories')
         if categories:
@@ -324,56 +694,75 @@ class Foursquare__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTo
                 category_header = 'CATEGORY_{}'.format(category_num)
                 ROW[category_header] = category.get('name', '-')
         
-        ROW['CHECKINS'] = venue.get('stats', {}).get('checkinsCount', '-')
+        ROW['CHECKINS'] = (venue.get('stats') or _EMPTY).get('checkinsCount', '-')
         ROW['WEBSITE'] = venue.get('url', '-')
-        ROW['PRICE'] = venue.get('price', {}).get('tier', {})
+        ROW['PRICE'] = (venue.get('price') or _EMPTY).get('tier', '-')
         ROW['RATING'] = venue.get('rating', '-')
         ROW['REVIEWS_AMOUNT'] = venue.get('ratingSignals', '-')
         ROW['CREATED_AT'] = venue.get('createdAt', '-')
-        ROW['LIKES_AMOUNT'] = venue.get('likes', {}).get('count', '-')
+        ROW['LIKES_AMOUNT'] = (venue.get('likes') or _EMPTY).get('count', '-')
 
         if isinstance(ROW['CREATED_AT'], int):
             converted_epoch = datetime.datetime.fromtimestamp(ROW['CREATED_AT']).strftime('%d-%m-%Y')
         else:
             converted_epoch = '-'
         ROW['CREATED_AT_DATE'] = converted_epoch
-        ROW['RUN_TIMESTAMP'] = datetime.datetime.utcnow().strftime('%d.%m.%Y/%H:%M:%S')
+        ROW['RUN_TIMESTAMP'] = _run_timestamp()
          
-        DATA['rows'].append(ROW)
+        writer.writerow(ROW)
             
-    def run(self, DATA):
+    def run(self, writer):
+        venues_search_requests = []
         venues_details_terms = collections.defaultdict(list)
-        for term in self._terms:
-            if not any(True for i in ['q', 'near', 'latitude', 'longitude', 'foursquare_id'] if term.get(i)):
-                continue
-            
-            time.sleep(self._delay_per_request)
-            search_term_str = '|'.join([v for k, v in term.items() if k != 'client_id' and k != 'client_secret'])
+        details_rows = []
+        details_requests = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for term in self._terms:
+                if not any(True for i in ['q', 'near', 'latitude', 'longitude', 'foursquare_id'] if term.get(i)):
+                    continue
 
-            if _VERBOSE:
-                print('+ {}'.format(search_term_str))
-                
-            self._update_term_credentials(term)
-            if term.get('latitude') and term.get('longitude'):
-                term['ll'] = '{},{}'.format(term.pop('latitude'), term.pop('longitude'))
-            
-            if term.get('foursquare_id'):
-                venues_details_terms[search_term_str].append({'foursquare_id': term.get('foursquare_id')})
-                print('  foursquare id added to the queue', end='\n'*2)
-                continue
-                
-            self.venue_search_endpoint(term)
-            ids = self.parse_venues_search_json_response()
-            venues_details_terms[search_term_str].extend(ids)
+                search_term_str = '|'.join([v for k, v in term.items() if k != 'client_id' and k != 'client_secret'])
+
+                if _VERBOSE:
+                    print('+ {}'.format(search_term_str))
 
-            if _VERBOSE:
-                print('  amount of venues extracted: {}'.format(len(ids)), end='\n'*2)
-            
-        for search_term_str, terms in venues_details_terms.items():
-            for term in terms:
                 self._update_term_credentials(term)
-                self.venue_details_endpoint(term)
-                self.parse_venue_details_json_response(DATA, search_term_str)
+                if term.get('latitude') and term.get('longitude'):
+                    term['ll'] = '{},{}'.format(term.pop('latitude'), term.pop('longitude'))
+
+                if term.get('foursquare_id'):
+                    venues_search_requests.append((search_term_str, [{'foursquare_id': term.get('foursquare_id')}], None))
+                    print('  foursquare id added to the queue', end='\n'*2)
+                    continue
+
+                venues_search_requests.append((search_term_str, None, executor.submit(self.venue_search_endpoint, term)))
+
+            for search_term_str, ids, future in venues_search_requests:
+                if future is not None:
+                    self._response, self._response_json = future.result()
+                    ids = self.parse_venues_search_json_response()
+
+                    if _VERBOSE:
+                        print('  {}: amount of venues extracted: {}'.format(search_term_str, len(ids)), end='\n'*2)
+
+                venues_details_terms[search_term_str].extend(ids)
+
+            # one details request per unique venue id, a row per each query it was found by
+            for search_term_str, terms in venues_details_terms.items():
+                for term in terms:
+                    venue_id = term['foursquare_id']
+                    details_rows.append((venue_id, search_term_str))
+                    if venue_id not in details_requests:
+                        self._update_term_credentials(term)
+                        details_requests[venue_id] = executor.submit(self.venue_details_endpoint, term)
+
+            # rows are written as responses arrive, a response is released after its id's last row
+            last_row_index = {venue_id: i for i, (venue_id, _) in enumerate(details_rows)}
+            for i, (venue_id, search_term_str) in enumerate(details_rows):
+                self._response, response_json = details_requests[venue_id].result()
+                self.parse_venue_details_json_response(response_json, writer, search_term_str)
+                if last_row_index[venue_id] == i:
+                    del details_requests[venue_id]
 
 
 class Facebook__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTools, ApiStats):
@@ -392,6 +781,7 @@ class Facebook__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTool
         'PLACES_SEARCH': 'https://graph.facebook.com/v3.2/search',
         'PLACE_INFORMATION': 'https://graph.facebook.com/v3.3/{}'
     }
+    CACHED_ENDPOINTS = ['PLACE_INFORMATION']
 
     ID_FIELDS = [
         'about', 'website', 'category_list', 'checkins', 'cover', 'engagement', 'hours', 'id',
@@ -403,38 +793,47 @@ class Facebook__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTool
 
     STATS_HEADERS = ['x-app-usage']
 
-    def __init__(self, *, errors_limit=3, delay_per_request=0.1):
+    def __init__(self, *, errors_limit=3, delay_per_request=0.1, max_workers=8, cache_expire_after=86400):
+        """ cache_expire_after - seconds details responses are cached for (with requests-cache installed),
+        0 or None disables the cache.
+        """
+        super().__init__(
+            rate=1 / delay_per_request if delay_per_request else None, cache_expire_after=cache_expire_after
+        )
         self._errors_limit = errors_limit
-        self._delay_per_request = delay_per_request
+        self._max_workers = max_workers
+        self._request_kwargs = {}
         
         self.keys = self.parse_keys(self.API_ALIAS)
         self._access_token = self.keys.get('access_token', '')
         
-        self._terms = self.parse_terms(self.TERMS_HEADERS)
+        self._terms = self.parse_terms(tuple(self.TERMS_HEADERS))
 
     def _update_term_credentials(self, term):
         term['access_token'] = self._access_token
 
     def places_search_endpoint(self, term):
         """ q(term) or center required.
+        --> requests.Response, dict
         """
-        self._response, self._response_json = self.GET(
-            self.ENDPOINTS['PLACES_SEARCH'], params=term
+        return self.GET(
+            self.ENDPOINTS['PLACES_SEARCH'], params=term, **self._request_kwargs
         )
 
     def places_info_endpoint(self, term):
-        """ q(term) or center required.
+        """ facebook_id required.
+        --> requests.Response, dict
         """
-        self._response, self._response_json = self.GET(
-            self.ENDPOINTS['PLACE_INFORMATION'].format(term.pop('facebook_id')), params=term
+        return self.GET(
+            self.ENDPOINTS['PLACE_INFORMATION'].format(term.pop('facebook_id')), params=term, **self._request_kwargs
         )
 
     def parse_places_details_json_response(self):
         places = self._response_json.get('data', [])
         return [{'facebook_id': place['id']} for place in places if place.get('id')]
 
-    def parse_places_info_json_response(self, DATA, search_term_str):
-        place = self._response_json
+    def parse_places_info_json_response(self, response_json, writer, search_term_str):
+        place = response_json
 
         ROW = {}
         ROW['QUERY'] = search_term_str
@@ -445,8 +844,9 @@ class Facebook__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTool
         ROW['PHONE'] = place.get('phone', '-')
 
         ROW['ADDRESS'] = place.get('single_line_address', '-')
-        ROW['LATITUDE'] = place.get('location', {}).get('latitude', '-')
-        ROW['LONGITUDE'] = place.get('location', {}).get('longitude', '-')
+        location = place.get('location') or _EMPTY
+        ROW['LATITUDE'] = location.get('latitude', '-')
+        ROW['LONGITUDE'] = location.get('longitude', '-')
 
         categories = place.get('category_list')
         if categories:
@@ -461,51 +861,70 @@ class Facebook__ApiWrapper(RequestEngine, KeysParser, InputTermsParser, FileTool
         ROW['REVIEWS_AMOUNT'] = str(place.get('rating_count', '-')).replace('.', ',')
         ROW['RATING'] = place.get('overall_star_rating', '-')
         ROW['IS_CLOSED'] = str(place.get('is_permanently_closed', '-'))
-        ROW['LIKES_AMOUNT'] = place.get('engagement', {}).get('count', '-')
+        ROW['LIKES_AMOUNT'] = (place.get('engagement') or _EMPTY).get('count', '-')
         ROW['CHECKINS'] = place.get('checkins', '-')
-        ROW['RUN_TIMESTAMP'] = datetime.datetime.utcnow().strftime('%d.%m.%Y/%H:%M:%S')
+        ROW['RUN_TIMESTAMP'] = _run_timestamp()
  
-        DATA['rows'].append(ROW)
+        writer.writerow(ROW)
 
-    def run(self, DATA):
+    def run(self, writer):
+        places_search_requests = []
         places_details_terms = collections.defaultdict(list)
-        for term in self._terms:
-            if not any(True for i in ['q', 'latitude', 'longitude', 'facebook_id'] if term.get(i)):
-                continue
-            
-            time.sleep(self._delay_per_request)
-            search_term_str = '|'.join([v for k, v in term.items() if k != 'access_token'])
-            
-            if _VERBOSE:
-                print('+ {}'.format(search_term_str))
+        details_rows = []
+        details_requests = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for term in self._terms:
+                if not any(True for i in ['q', 'latitude', 'longitude', 'facebook_id'] if term.get(i)):
+                    continue
 
-            self._update_term_credentials(term)
-            term['type'] = 'place'
+                search_term_str = '|'.join([v for k, v in term.items() if k != 'access_token'])
 
-            if term.get('facebook_id'):
-                places_details_terms[search_term_str].append({'facebook_id': term.get('facebook_id')})
-                print('  facebook id added to the queue', end='\n'*2)
-                continue
+                if _VERBOSE:
+                    print('+ {}'.format(search_term_str))
 
-            if not term.get('limit'):
-                term['limit'] = 100
+                self._update_term_credentials(term)
+                term['type'] = 'place'
 
-            if term.get('latitude') and term.get('longitude'):
-                term['center'] = '{},{}'.format(term.pop('latitude'), term.pop('longitude'))
+                if term.get('facebook_id'):
+                    places_search_requests.append((search_term_str, [{'facebook_id': term.get('facebook_id')}], None))
+                    print('  facebook id added to the queue', end='\n'*2)
+                    continue
 
-            self.places_search_endpoint(term)
-            ids = self.parse_places_details_json_response()
-            places_details_terms[search_term_str].extend(ids)  
+                if not term.get('limit'):
+                    term['limit'] = 100
 
-            if _VERBOSE:
-                print('  amount of places extracted: {}'.format(len(ids)), end='\n'*2)
+                if term.get('latitude') and term.get('longitude'):
+                    term['center'] = '{},{}'.format(term.pop('latitude'), term.pop('longitude'))
 
-        for search_term_str, terms in places_details_terms.items():
-            for term in terms:
-                term['fields'] = ','.join(self.ID_FIELDS)
-                self._update_term_credentials(term)
-                self.places_info_endpoint(term)
-                self.parse_places_info_json_response(DATA, search_term_str)
+                places_search_requests.append((search_term_str, None, executor.submit(self.places_search_endpoint, term)))
+
+            for search_term_str, ids, future in places_search_requests:
+                if future is not None:
+                    self._response, self._response_json = future.result()
+                    ids = self.parse_places_details_json_response()
+
+                    if _VERBOSE:
+                        print('  {}: amount of places extracted: {}'.format(search_term_str, len(ids)), end='\n'*2)
+
+                places_details_terms[search_term_str].extend(ids)
+
+            # one details request per unique place id, a row per each query it was found by
+            for search_term_str, terms in places_details_terms.items():
+                for term in terms:
+                    place_id = term['facebook_id']
+                    details_rows.append((place_id, search_term_str))
+                    if place_id not in details_requests:
+                        term['fields'] = ','.join(self.ID_FIELDS)
+                        self._update_term_credentials(term)
+                        details_requests[place_id] = executor.submit(self.places_info_endpoint, term)
+
+            # rows are written as responses arrive, a response is released after its id's last row
+            last_row_index = {place_id: i for i, (place_id, _) in enumerate(details_rows)}
+            for i, (place_id, search_term_str) in enumerate(details_rows):
+                self._response, response_json = details_requests[place_id].result()
+                self.parse_places_info_json_response(response_json, writer, search_term_str)
+                if last_row_index[place_id] == i:
+                    del details_requests[place_id]
 
 
 def main(wrapper_classes):
@@ -515,35 +934,30 @@ def main(wrapper_classes):
     if not os.path.exists(default_input_filename):
         filetools.create_default_input(default_input_filename)
 
-    DATA = collections.defaultdict(list)
-    for wrapper_class in wrapper_classes:
-        wrapper = wrapper_class()
+    with filetools.open_stream() as writer:
+        for wrapper_class in wrapper_classes:
+            wrapper = wrapper_class()
 
-        if _VERBOSE:
-            print('-'*60)
-            print('RUNNING:', wrapper_class.__name__, end='\n'*2)
+            if _VERBOSE:
+                print('-'*60)
+                print('RUNNING:', wrapper_class.__name__, end='\n'*2)
 
-        try:
-            if not wrapper.keys: raise KeysParserError('Keys not set')
+            try:
+                if not wrapper.keys: raise KeysParserError('Keys not set')
             
-            wrapper.run(DATA)
+                wrapper.run(writer)
 
-            if _VERBOSE:
-                wrapper.print_api_stats_from_headers()
-                
-            if _VERBOSE and wrapper._response.status_code != 200:
-                print('\n:{}: {}'.format(
-                    wrapper.__class__.__name__.upper(), wrapper._response.text
-                    )
-                )
+                if _VERBOSE:
+                    wrapper.print_api_stats_from_headers()
                 
-        except KeysParserError as e:
-            print(e)
+            except KeysParserError as e:
+                print(e)
         
-        except Exception as e:
-            print('*'*3, '\nFAILED {} : {}'.format(wrapper.__class__.__name__, e))
+            except Exception as e:
+                print('*'*3, '\nFAILED {} : {}'.format(wrapper.__class__.__name__, e))
 
-    filetools.csv_out(DATA)
+            finally:
+                wrapper._session.close()
 
 
 